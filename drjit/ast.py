@@ -1,8 +1,11 @@
 import ast
+import dis
 import types
 import inspect
 import linecache
+import re
 import sys
+import weakref
 from typing import (
     Any,
     Optional,
@@ -10,6 +13,9 @@ from typing import (
     List,
     TypeVar,
     Callable,
+    Dict,
+    Iterable,
+    Mapping,
     Union,
     Literal,
     NoReturn,
@@ -28,19 +34,72 @@ else:
 T = TypeVar("T")
 T2 = TypeVar("T2")
 
+# Expression contexts are stateless and can be shared by all generated nodes
+_LOAD, _STORE = ast.Load(), ast.Store()
+
+# Keyword arguments accepted by drjit.hint()
+_HINT_KEYS = frozenset((
+    "exclude",
+    "include",
+    "label",
+    "mode",
+    "max_iterations",
+    "strict",
+    "compress",
+))
+
+# Hints that take a list of variable names, which are consumed by the
+# transformation itself rather than being forwarded
+_HINT_LIST_KEYS = frozenset(("exclude", "include"))
+
+# Shared (read-only) result of _SyntaxVisitor.extract_hints() when no hints
+# were specified
+_NO_HINTS: Mapping[str, Any] = types.MappingProxyType({})
+
 class _SyntaxVisitor(ast.NodeTransformer):
-    def __init__(self, recursive, filename, line_offset):
+    # Store the per-instance state in slots, which is accessed very
+    # frequently while visiting the AST
+    __slots__ = (
+        "var_bits",
+        "var_names",
+        "var_r",
+        "var_w",
+        "par_r",
+        "par_w",
+        "par_w_union",
+        "recursive",
+        "entered",
+        "op_stack",
+        "filename",
+        "comments",
+        "transformed",
+        "func_args",
+    )
+
+    def __init__(self, recursive, filename, comments=False):
         super().__init__()
 
-        # Keep track of read/written variables
-        self.var_r, self.var_w = set(), set()
+        # Every variable name is assigned a unique bit upon first encounter.
+        # Sets of variables are represented as integer bit masks, which
+        # turns the set operations below into cheap bitwise arithmetic.
+        self.var_bits: Dict[str, int] = {}
+        self.var_names: List[str] = []
+
+        # Keep track of read/written variables (bit masks)
+        self.var_r, self.var_w = 0, 0
 
         # As the above, but for parent AST nodes
-        self.par_r, self.par_w = [], []
+        self.par_r: List[int] = []
+        self.par_w: List[Tuple[int, int]] = []
+
+        # Union of all masks in 'self.par_w', updated incrementally as
+        # nodes are entered/exited. The previous value is saved on the
+        # 'self.par_w' stack.
+        self.par_w_union = 0
 
         # Recursion-related parameters
         self.recursive = recursive
-        self.depth = 0
+        self.entered = False
 
         # Stack of conditionals ('cond') / and for/while loops ('loop') that
         # are currently being transformed. This a list of 2-tuples, e.g.,
@@ -50,32 +109,141 @@ class _SyntaxVisitor(ast.NodeTransformer):
 
         # Information for reporting syntax error
         self.filename = filename
-        self.line_offset = line_offset
+
+        # Delineate transformed code with comments? They are only useful when
+        # inspecting the output, and otherwise cost two bytecode instructions
+        # (LOAD_CONST/POP_TOP) each time the function runs.
+        self.comments = comments
+
+        # Was the AST modified, i.e., was any 'if' statement or 'while' loop
+        # rewritten, or a dr.hint() call removed from a predicate?
+        self.transformed = False
+
+        # Parameter lists of generated functions, indexed by the names of
+        # the state variables. They are only read by compile() and can
+        # therefore be shared by all constructs with the same state.
+        self.func_args: Dict[Tuple[str, ...], ast.arguments] = {}
+
+    def var_bit(self, name: str) -> int:
+        # Return the bit mask associated with a variable name
+        bit = self.var_bits.get(name)
+        if bit is None:
+            bit = self.var_bits[name] = 1 << len(self.var_names)
+            self.var_names.append(name)
+        return bit
+
+    def var_mask(self, names: Iterable[str]) -> int:
+        # Convert a set of variable names into a bit mask
+        mask = 0
+        for name in names:
+            mask |= self.var_bit(name)
+        return mask
+
+    def var_list(self, mask: int) -> List[str]:
+        # Convert a bit mask into a list of variable names. They are returned
+        # in order of their first occurrence in the function (bit order),
+        # which is deterministic and avoids sorting the names.
+        names, result = self.var_names, []
+        while mask:
+            low = mask & -mask
+            result.append(names[low.bit_length() - 1])
+            mask ^= low
+        return result
+
+    def visit(self, node: ast.AST) -> Any:
+        # Look up the handler in a table built once per class. This is
+        # cheaper than the string concatenation + getattr() performed by
+        # ast.NodeVisitor.visit() for every single node.
+        visitor = self._dispatch.get(type(node))
+        if visitor is None:
+            return self.generic_visit(node)
+        return visitor(self, node)
+
+    def generic_visit(self, node: ast.AST) -> ast.AST:
+        # Don't descend into nodes that cannot contain variable accesses or
+        # control flow that is relevant to the transformation
+        if type(node) in self._leaf_types:
+            return node
+        return super().generic_visit(node)
+
+    def visit_expr(self, node: ast.expr) -> ast.AST:
+        # Expressions cannot contain statements, hence nothing will be
+        # rewritten below this point. Track variable accesses using an
+        # explicit stack instead of recursing through visit() and
+        # generic_visit() for every node of the expression.
+        dispatch, leaf_types = self._dispatch, self._leaf_types
+        visit_expr = _SyntaxVisitor.visit_expr
+        stack: List[ast.AST] = [node]
+
+        while stack:
+            n = stack.pop()
+            tp = type(n)
+            visitor = dispatch.get(tp)
+            if visitor is not None and visitor is not visit_expr:
+                visitor(self, n)
+                continue
+            elif tp in leaf_types:
+                continue
+
+            children: List[ast.AST] = []
+            for field in n._fields:
+                value = getattr(n, field, None)
+                if isinstance(value, ast.AST):
+                    children.append(value)
+                elif isinstance(value, list):
+                    children.extend(v for v in value if isinstance(v, ast.AST))
+
+            # Process children in order (the stack is LIFO)
+            children.reverse()
+            stack.extend(children)
+
+        return node
 
     def visit_FunctionDef(self, node: ast.FunctionDef) -> ast.AST:
-        if self.recursive or self.depth == 0:
+        if self.recursive or not self.entered:
             # Process only the outermost function
-            self.depth += 1
+            self.entered = True
 
             # Keep track of read/written variables
             var_r, var_w = self.var_r, self.var_w
-            self.var_r, self.var_w = set(), set()
+            self.var_r, self.var_w = 0, 0
 
             # Add function parameters to self.var_w
             for o1 in (node.args.args, node.args.posonlyargs, node.args.kwonlyargs):
                 for o2 in o1:
-                    self.var_w.add(o2.arg)
+                    self.var_w |= self.var_bit(o2.arg)
 
             result = self.generic_visit(node)
             self.var_r, self.var_w = var_r, var_w
-            self.depth -= 1
             return result
 
         return node
 
+    def visit_ClassDef(self, node: ast.ClassDef) -> ast.AST:
+        # Names assigned in a class body are class attributes, not local
+        # variables. Only descend to find methods when processing nested
+        # functions, and don't track variable accesses there.
+        if not self.recursive:
+            return node
+
+        var_r, var_w = self.var_r, self.var_w
+        result = self.generic_visit(node)
+        self.var_r, self.var_w = var_r, var_w
+        return result
+
+    def visit_Lambda(self, node: ast.Lambda) -> ast.AST:
+        # The body of a lambda function is a separate scope that cannot
+        # contain statements. Only default arguments are evaluated here.
+        for d in node.args.defaults:
+            self.visit(d)
+        for d in node.args.kw_defaults:
+            if d is not None:
+                self.visit(d)
+        return node
+
     def raise_syntax_error(self, node: ast.AST, msg: str) -> NoReturn:
         if hasattr(node, "lineno") and node.lineno:
-            lineno = node.lineno + self.line_offset
+            lineno = node.lineno
             text = linecache.getline(self.filename, lineno)
         else:
             text, lineno = None, None
@@ -83,7 +251,7 @@ class _SyntaxVisitor(ast.NodeTransformer):
         if lineno:
             s.lineno = lineno
         if hasattr(node, "end_lineno") and node.end_lineno:
-            s.end_lineno = node.end_lineno + self.line_offset
+            s.end_lineno = node.end_lineno
         if hasattr(node, "col_offset"):
             s.offset = node.col_offset
         if hasattr(node, "end_col_offset"):
@@ -141,40 +309,30 @@ class _SyntaxVisitor(ast.NodeTransformer):
             return self.generic_visit(node)
 
     def visit_Name(self, node: ast.Name) -> ast.AST:
-        if isinstance(node.ctx, ast.Load):
-            self.var_r.add(node.id)
-        elif isinstance(node.ctx, ast.Store):
-            self.var_w.add(node.id)
+        # Look up known variables directly, bits are never zero
+        ctx, name = type(node.ctx), node.id
+        if ctx is ast.Load:
+            self.var_r |= self.var_bits.get(name) or self.var_bit(name)
+        elif ctx is ast.Store:
+            self.var_w |= self.var_bits.get(name) or self.var_bit(name)
         return node
 
     def visit_comp(self,
                    node: Union[ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp]) -> ast.AST:
-        var_r, var_w = self.var_r, set(self.var_w)
-        self.var_r = set()
+        var_r, var_w = self.var_r, self.var_w
+        self.var_r = 0
         result = self.generic_visit(node)
 
-        comp_targets = set()
+        comp_targets = 0
         for comp in node.generators:
-            comp_targets.add(comp.target.id)
+            comp_targets |= self.var_bit(comp.target.id)
 
         # Targets should not be considered, and no assigments can be made
-        self.var_r = (self.var_r - comp_targets) | var_r
+        self.var_r = (self.var_r & ~comp_targets) | var_r
         self.var_w = var_w
 
         return result
 
-    def visit_ListComp(self, node: ast.ListComp) -> ast.AST:
-        return self.visit_comp(node)
-
-    def visit_SetComp(self, node: ast.DictComp) -> ast.AST:
-        return self.visit_comp(node)
-
-    def visit_DictComp(self, node: ast.DictComp) -> ast.AST:
-        return self.visit_comp(node)
-
-    def visit_GeneratorExp(self, node: ast.GeneratorExp) -> ast.AST:
-        return self.visit_comp(node)
-
     # def visit_Attribute(self, node: ast.Attribute) -> ast.AST:
     #     n = node
     #     seq = []
@@ -190,13 +348,13 @@ class _SyntaxVisitor(ast.NodeTransformer):
     #     self.var_r.add(".".join(reversed(seq)))
     #     return node
 
-    def extract_hints(self, node: ast.AST) -> Tuple[ast.AST, dict]:
-        if (
-            not isinstance(node, ast.Call)
-            or not isinstance(node.func, ast.Attribute)
-            or node.func.attr != "hint"
-        ):
-            return node, {}
+    def extract_hints(self, node: ast.AST) -> Tuple[ast.AST, Mapping[str, Any]]:
+        # Fast path for the common case of a predicate without dr.hint()
+        if type(node) is not ast.Call:
+            return node, _NO_HINTS
+        func = node.func
+        if type(func) is not ast.Attribute or func.attr != "hint":
+            return node, _NO_HINTS
 
         if len(node.args) != 1:
             self.raise_syntax_error(
@@ -205,7 +363,7 @@ class _SyntaxVisitor(ast.NodeTransformer):
 
         hints = {}
         for k in node.keywords:
-            if k.arg == "exclude" or k.arg == "include":
+            if k.arg in _HINT_LIST_KEYS:
                 value: Any = set()
                 if isinstance(k.value, ast.List):
                     for e in k.value.elts:
@@ -228,44 +386,40 @@ class _SyntaxVisitor(ast.NodeTransformer):
                 value = k.value
             hints[k.arg] = value
 
-        valid_keys = [
-            "exclude",
-            "include",
-            "label",
-            "mode",
-            "max_iterations",
-            "strict",
-            "compress",
-        ]
-        for k2 in hints.keys():
-            if k2 not in valid_keys:
-                self.raise_syntax_error(
-                    node, f'drjit.hint() does not support the keyword argument "{k2}".'
-                )
+        invalid = hints.keys() - _HINT_KEYS
+        if invalid:
+            k2 = next(k for k in hints if k in invalid)
+            self.raise_syntax_error(
+                node, f'drjit.hint() does not support the keyword argument "{k2}".'
+            )
+        # The dr.hint() call is removed from the predicate
+        self.transformed = True
         return node.args[0], hints
 
-    def rewrite_and_track(self, node: T) -> Tuple[T, list, list, dict, bool]:
+    def rewrite_and_track(self, node: T) -> Tuple[T, list, list, Mapping[str, Any], bool]:
         # Keep track of variable reads/writes
         self.par_r.append(self.var_r)
-        self.par_w.append(self.var_w)
-        self.var_r, self.var_w = set(), set()
+        self.par_w.append((self.var_w, self.par_w_union))
 
-        # Collect variables read/written by parent nodes
-        par_r, par_w = set(), set()
-        for s in self.par_r:
-            par_r |= s
-        for s in self.par_w:
-            par_w |= s
+        # Collect variables written by parent nodes
+        par_w = self.par_w_union = self.par_w_union | self.var_w
+        self.var_r, self.var_w = 0, 0
 
         # Extract hints, if available
-        assert isinstance(node, ast.If) or isinstance(node, ast.While)
+        tp = type(node)
+        assert tp is ast.If or tp is ast.While
         test_fn, hints = self.extract_hints(node.test)
         node.test = cast(ast.expr, test_fn)
         mode = hints.get("mode", None)
-        is_scalar = isinstance(mode, ast.Constant) and mode.value == "scalar"
+        if mode is None:
+            # Predicates built from literals (e.g. 'while True:') are
+            # plain Python values and don't need to be transformed
+            is_scalar = _is_constant_expr(node.test)
+        else:
+            is_scalar = isinstance(mode, ast.Constant) and mode.value == "scalar"
 
         # Process the node recursively
-        if isinstance(node, ast.While):
+        if tp is ast.While:
             self.op_stack.append(("loop", is_scalar))
             node = cast(T, self.generic_visit(node))
 
@@ -276,29 +430,13 @@ class _SyntaxVisitor(ast.NodeTransformer):
             var_r = self.var_r
 
             self.op_stack.pop()
-        elif isinstance(node, ast.If):
+        elif tp is ast.If:
             self.op_stack.append(("cond", is_scalar))
 
             # Get information about variable accesses in each branch
-            body = []
-            for n in node.body:
-                n = self.visit(n)
-                if isinstance(n, ast.AST):
-                    body.append(n)
-                else:
-                    body.extend(n)
-
-            node.body = body
-            self.var_w, var_w1 = set(), self.var_w
-
-            orelse = []
-            for n in node.orelse:
-                n = self.visit(n)
-                if isinstance(n, ast.AST):
-                    orelse.append(n)
-                else:
-                    orelse.extend(n)
-            node.orelse = orelse
+            node.body = self.visit_block(node.body)
+            self.var_w, var_w1 = 0, self.var_w
+            node.orelse = self.visit_block(node.orelse)
             var_w2 = self.var_w
 
             # Set of written variables consists of:
@@ -307,35 +445,56 @@ class _SyntaxVisitor(ast.NodeTransformer):
             # - variables that were written before, and which
             #   are written on at least one branch
             var_w = (var_w1 & var_w2) | ((var_w1 | var_w2) & par_w)
-            var_r = self.var_r
             node.test = cast(ast.expr, self.generic_visit(node.test))
+            var_r = self.var_r
 
             self.op_stack.pop()
         else:
             raise RuntimeError("rewrite_and_track(): Unsupported node type!")
 
         # Do not import globals (variables that are only read and never defined)
-        var_r -= var_r - var_w - par_w
+        var_r &= var_w | par_w
 
         # Include/exclude variables as requested by the user
         if "include" in hints:
-            include = set(hints["include"])
+            include = self.var_mask(hints["include"])
             var_r |= include
             var_w |= include
 
         if "exclude" in hints:
-            exclude = set(hints["exclude"])
-            var_r -= exclude
-            var_w -= exclude
+            exclude = self.var_mask(hints["exclude"])
+            var_r &= ~exclude
+            var_w &= ~exclude
 
+        var_w_parent, self.par_w_union = self.par_w.pop()
         self.var_r = var_r | self.par_r.pop()
-        self.var_w = var_w | self.par_w.pop()
+        self.var_w = var_w | var_w_parent
 
-        state_out = sorted(var_r | var_w)
-        state_in = sorted(var_r | (var_w & par_w))
+        state_out = self.var_list(var_r | var_w)
+        state_in = self.var_list(var_r | (var_w & par_w))
 
         return node, state_in, state_out, hints, is_scalar
 
+    def make_args(self, names: List[str], loc: Dict[str, Any]) -> ast.arguments:
+        key = tuple(names)
+        args = self.func_args.get(key)
+        if args is None:
+            args = self.func_args[key] = _make_args(names, loc)
+        return args
+
+    def visit_block(self, stmts: List[ast.stmt]) -> List[ast.stmt]:
+        # Visit a list of statements in a single pass, splicing in the
+        # statement lists returned by visit_If()/visit_While()
+        result: List[ast.stmt] = []
+        visit, append, extend = self.visit, result.append, result.extend
+        for n in stmts:
+            n = visit(n)
+            if isinstance(n, ast.AST):
+                append(n)
+            else:
+                extend(n)
+        return result
+
     def visit_For(self, node: ast.For) -> ast.AST:
         self.op_stack.append(("loop", True))
         result = self.generic_visit(node)
@@ -348,142 +507,74 @@ class _SyntaxVisitor(ast.NodeTransformer):
         if is_scalar:
             return node
 
+        self.transformed = True
+
+        # Generated nodes inherit the source location of the 'if' statement
+        loc = _loc(node)
+
         # 1. Names of generated functions
         ifstmt_name = "_if_stmt"
         true_name = ifstmt_name + "_true"
         false_name = ifstmt_name + "_false"
 
-        # 2. Generate a function representing the condition
-        #    .. which takes all state variables as input
-        func_args = ast.arguments(
-            args=[ast.arg(k) for k in state_in],
-            posonlyargs=[],
-            kwonlyargs=[],
-            defaults=[],
-            kw_defaults=[],
-        )
-
-        # 3. Generate a function representing the if/else branches
-        load, store, delete = ast.Load(), ast.Store(), ast.Del()
-        true_fn = ast.FunctionDef(
-            name=true_name,
-            args=func_args,
-            body=[
-                *node.body,
-                ast.Return(
-                    value=ast.Tuple(
-                        elts=[ast.Name(id=k, ctx=load) for k in state_out], ctx=load
-                    )
-                ),
-            ],
-            decorator_list=[],
-            lineno=node.lineno,
-            col_offset=node.col_offset,
-            end_lineno=node.end_lineno,
-            end_col_offset=node.end_col_offset,
-        )
-
-        false_fn = ast.FunctionDef(
-            name=false_name,
-            args=func_args,
-            body=[
-                *node.orelse,
-                ast.Return(
-                    value=ast.Tuple(
-                        elts=[ast.Name(id=k, ctx=load) for k in state_out], ctx=load
-                    )
-                ),
-            ],
-            decorator_list=[],
-            lineno=node.lineno,
-            col_offset=node.col_offset,
-            end_lineno=node.end_lineno,
-            end_col_offset=node.end_col_offset,
-        )
+        # 2. Parameter list of the generated functions, which take all
+        #    state variables as input
+        func_args = self.make_args(state_in, loc)
+
+        # 3. Generate a function representing the if/else branches. Both
+        #    return the same state tuple, which is only ever read and can
+        #    therefore be shared between them (and with the call arguments)
+        rv = _make_names(state_out, _LOAD, loc)
+        true_fn = _make_func(true_name, func_args, node.body, rv, loc)
+        stmts: List[ast.AST] = [true_fn]
+
+        # Without an 'else' branch, the 'false' function simply returns its
+        # inputs. Use a shared function in this case instead of creating
+        # a new one each time the transformed code runs.
+        if not node.orelse and state_in == state_out:
+            false_name = _IF_STMT_IDENTITY_NAME
+        else:
+            stmts.append(
+                _make_func(false_name, func_args, node.orelse, rv, loc)
+            )
 
-        # 7. Import the Dr.Jit if_stmt function
-        import_stmt = ast.ImportFrom(
-            module="drjit",
-            names=[ast.alias(name="if_stmt", asname=ifstmt_name)],
-            level=0,
-        )
+        # 4. Call drjit.if_stmt()
+        if state_in == state_out:
+            args, arg_labels = rv, _make_labels(state_out, loc)
+            rv_labels = arg_labels
+        else:
+            args = _make_names(state_in, _LOAD, loc)
+            arg_labels = _make_labels(state_in, loc)
+            rv_labels = _make_labels(state_out, loc)
 
-        # 8. Call drjit.if_stmt()
         call_kwargs = [
-            ast.keyword(
-                arg="arg_labels",
-                value=ast.Tuple(
-                    elts=[ast.Constant(k) for k in state_in],
-                    ctx=load,
-                ),
-            ),
-            ast.keyword(
-                arg="rv_labels",
-                value=ast.Tuple(
-                    elts=[ast.Constant(k) for k in state_out],
-                    ctx=load,
-                ),
-            ),
+            ast.keyword(arg="arg_labels", value=arg_labels, **loc),
+            ast.keyword(arg="rv_labels", value=rv_labels, **loc),
         ]
 
-        for k, v in hints.items():
-            if k == "include" or k == "exclude":
-                continue
-            call_kwargs.append(ast.keyword(arg=k, value=v))
-
-        if_expr = ast.Assign(
-            targets=[
-                ast.Tuple(
-                    elts=[ast.Name(id=k, ctx=store) for k in state_out],
-                    ctx=store,
-                )
-            ],
-            value=ast.Call(
-                func=ast.Name(id=ifstmt_name, ctx=load),
-                args=[
-                    ast.Tuple(
-                        elts=[ast.Name(id=k, ctx=load) for k in state_in], ctx=load
-                    ),
-                    node.test,
-                    ast.Name(id=true_name, ctx=load),
-                    ast.Name(id=false_name, ctx=load),
-                ],
-                keywords=call_kwargs,
-                lineno=node.lineno,
-                col_offset=node.col_offset,
-                end_lineno=node.end_lineno,
-                end_col_offset=node.end_col_offset,
-            ),
+        if_expr = _make_call(
+            _IF_STMT_NAME,
+            _make_names(state_out, _STORE, loc),
+            [args, node.test, ast.Name(id=true_name, ctx=_LOAD, **loc),
+             ast.Name(id=false_name, ctx=_LOAD, **loc)],
+            call_kwargs,
+            hints,
+            loc,
         )
 
-        # 10. Some comments (as strings) to delineate processed parts of the AST
-        comment_start = ast.Expr(
-            ast.Constant("---- if statement transformed by dr.syntax ----")
-        )
-        comment_mid = ast.Expr(
-            ast.Constant("------------- invoke dr.if_stmt ---------------")
-        )
-        comment_end = ast.Expr(
-            ast.Constant("-----------------------------------------------")
-        )
-
-        # 10. Delete local variables created while processing the loop
-        cleanup_targets = [
-            ast.Name(id=ifstmt_name, ctx=delete),
-            ast.Name(id=true_name, ctx=delete),
-            ast.Name(id=false_name, ctx=delete),
-        ]
+        if not self.comments:
+            return [*stmts, if_expr]
 
-        cleanup = ast.Delete(targets=cleanup_targets)
+        # 5. Some comments (as strings) to delineate processed parts of the AST
+        comment_start = _make_comment("---- if statement transformed by dr.syntax ----", loc)
+        comment_mid = _make_comment("------------- invoke dr.if_stmt ---------------", loc)
+        comment_end = _make_comment("-----------------------------------------------", loc)
 
         return [
             comment_start,
-            true_fn,
-            false_fn,
+            *stmts,
             comment_mid,
-            import_stmt,
             if_expr,
-            cleanup,
             comment_end,
         ]
 
@@ -492,131 +583,401 @@ class _SyntaxVisitor(ast.NodeTransformer):
         if is_scalar:
             return node
 
+        self.transformed = True
+
+        # Generated nodes inherit the source location of the 'while' loop
+        loc = _loc(node)
+
         # 1. Names of generated functions
         loop_name = "_loop"
         cond_name = loop_name + "_cond"
         body_name = loop_name + "_body"
 
-        # 5. Generate a function representing the loop condition
-        #    .. which takes all loop state variables as input
-        func_args = ast.arguments(
-            args=[ast.arg(k) for k in state],
-            posonlyargs=[],
-            kwonlyargs=[],
-            defaults=[],
-            kw_defaults=[],
-        )
+        # 2. Parameter list of the generated functions, which take all
+        #    loop state variables as input
+        func_args = self.make_args(state, loc)
 
+        # 3. Generate a function representing the loop condition
         cond_func = ast.FunctionDef(
             name=cond_name,
             args=func_args,
-            body=[ast.Return(value=node.test)],
+            body=[ast.Return(value=node.test, **loc)],
             decorator_list=[],
-            lineno=node.lineno,
-            col_offset=node.col_offset,
-            end_lineno=node.end_lineno,
-            end_col_offset=node.end_col_offset,
+            **loc,
         )
 
-        # 6. Generate a function representing the loop body
-        load, store, delete = ast.Load(), ast.Store(), ast.Del()
-        body_func = ast.FunctionDef(
-            name=body_name,
-            args=func_args,
-            body=[
-                *node.body,
-                ast.Return(
-                    value=ast.Tuple(
-                        elts=[ast.Name(id=k, ctx=load) for k in state], ctx=load
-                    )
-                ),
-            ],
-            decorator_list=[],
-            lineno=node.lineno,
-            col_offset=node.col_offset,
-            end_lineno=node.end_lineno,
-            end_col_offset=node.end_col_offset,
-        )
-
-        # 7. Import the Dr.Jit while_loop function
-        import_stmt = ast.ImportFrom(
-            module="drjit",
-            names=[ast.alias(name="while_loop", asname=loop_name)],
-            level=0,
-        )
+        # 4. Generate a function representing the loop body
+        state_load = _make_names(state, _LOAD, loc)
+        body_func = _make_func(body_name, func_args, node.body, state_load, loc)
 
-        # 8. Call drjit.while_loop()
+        # 5. Call drjit.while_loop()
         call_kwargs = [
-            ast.keyword(
-                arg="labels",
-                value=ast.Tuple(
-                    elts=[ast.Constant(k) for k in state],
-                    ctx=load,
-                ),
-            ),
+            ast.keyword(arg="labels", value=_make_labels(state, loc), **loc),
         ]
-        for k, v in hints.items():
-            if k == "include" or k == "exclude":
-                continue
-            call_kwargs.append(ast.keyword(arg=k, value=v))
-
-        while_expr = ast.Assign(
-            targets=[
-                ast.Tuple(
-                    elts=[ast.Name(id=k, ctx=store) for k in state],
-                    ctx=store,
-                )
-            ],
-            value=ast.Call(
-                func=ast.Name(id=loop_name, ctx=load),
-                args=[
-                    ast.Tuple(elts=[ast.Name(id=k, ctx=load) for k in state], ctx=load),
-                    ast.Name(id=cond_name, ctx=load),
-                    ast.Name(id=body_name, ctx=load),
-                ],
-                keywords=call_kwargs,
-                lineno=node.lineno,
-                col_offset=node.col_offset,
-                end_lineno=node.end_lineno,
-                end_col_offset=node.end_col_offset,
-            ),
-        )
 
-        # 9. Some comments (as strings) to delineate processed parts of the AST
-        comment_start = ast.Expr(
-            ast.Constant("-------- loop transformed by dr.syntax --------")
-        )
-        comment_mid = ast.Expr(
-            ast.Constant("----------- invoke dr.while_loop --------------")
-        )
-        comment_end = ast.Expr(
-            ast.Constant("-----------------------------------------------")
+        while_expr = _make_call(
+            _WHILE_LOOP_NAME,
+            _make_names(state, _STORE, loc),
+            [state_load, ast.Name(id=cond_name, ctx=_LOAD, **loc),
+             ast.Name(id=body_name, ctx=_LOAD, **loc)],
+            call_kwargs,
+            hints,
+            loc,
         )
 
-        # 10. Delete local variables created while processing the loop
-        cleanup_targets = [
-            ast.Name(id=loop_name, ctx=delete),
-            ast.Name(id=cond_name, ctx=delete),
-            ast.Name(id=body_name, ctx=delete),
-        ]
+        if not self.comments:
+            return [cond_func, body_func, while_expr]
 
-        cleanup = ast.Delete(targets=cleanup_targets)
+        # 6. Some comments (as strings) to delineate processed parts of the AST
+        comment_start = _make_comment("-------- loop transformed by dr.syntax --------", loc)
+        comment_mid = _make_comment("----------- invoke dr.while_loop --------------", loc)
+        comment_end = _make_comment("-----------------------------------------------", loc)
 
         return [
             comment_start,
             cond_func,
             body_func,
             comment_mid,
-            import_stmt,
             while_expr,
-            cleanup,
             comment_end,
         ]
 
+    # Node types skipped by generic_visit()
+    _leaf_types = frozenset((
+        ast.Constant,
+        ast.alias,
+        ast.arg,
+        ast.Import,
+        ast.ImportFrom,
+        ast.Global,
+        ast.Nonlocal,
+        ast.Pass,
+        ast.Break,
+        ast.Continue,
+    ))
+
+    # Handlers used by visit(), indexed by node type
+    _dispatch = {
+        ast.FunctionDef: visit_FunctionDef,
+        ast.AsyncFunctionDef: visit_FunctionDef,
+        ast.ClassDef: visit_ClassDef,
+        ast.Lambda: visit_Lambda,
+        ast.Return: visit_Return,
+        ast.Break: visit_Break,
+        ast.Continue: visit_Continue,
+        ast.Name: visit_Name,
+        ast.ListComp: visit_comp,
+        ast.SetComp: visit_comp,
+        ast.DictComp: visit_comp,
+        ast.GeneratorExp: visit_comp,
+        ast.For: visit_For,
+        ast.If: visit_If,
+        ast.While: visit_While,
+    }
+
+    # All other expression types are handled by visit_expr()
+    for _tp in ast.expr.__subclasses__():
+        _dispatch.setdefault(_tp, visit_expr)
+    del _tp
+
+
+def _is_constant_expr(node: ast.expr) -> bool:
+    # Check if an expression only combines literals via boolean operators and
+    # comparisons. Such an expression can never evaluate to a Dr.Jit array.
+    tp = type(node)
+    if tp is ast.Constant:
+        return True
+    elif tp is ast.UnaryOp:
+        return type(node.op) is ast.Not and _is_constant_expr(node.operand)
+    elif tp is ast.BoolOp:
+        return all(_is_constant_expr(v) for v in node.values)
+    elif tp is ast.Compare:
+        return _is_constant_expr(node.left) and \
+            all(_is_constant_expr(v) for v in node.comparators)
+    return False
+
+
+# The following helper functions construct the fixed parts of the code
+# generated by _SyntaxVisitor.visit_If() and _SyntaxVisitor.visit_While().
+# All generated nodes are directly given a source location ('loc'), which
+# avoids a separate ast.fix_missing_locations() pass over the whole tree.
+
+def _loc(node: ast.AST) -> Dict[str, Any]:
+    # Source location of 'node' as keyword arguments for node constructors
+    return {
+        "lineno": node.lineno,
+        "col_offset": node.col_offset,
+        "end_lineno": node.end_lineno,
+        "end_col_offset": node.end_col_offset,
+    }
+
+
+def _make_args(names: List[str], loc: Dict[str, Any]) -> ast.arguments:
+    # Positional parameter list of a generated function
+    return ast.arguments(
+        args=[ast.arg(k, **loc) for k in names],
+        posonlyargs=[],
+        kwonlyargs=[],
+        defaults=[],
+        kw_defaults=[],
+    )
+
+
+def _make_names(names: List[str], ctx: ast.expr_context, loc: Dict[str, Any]) -> ast.Tuple:
+    # Tuple of variable references, e.g. '(a, b, c)'
+    return ast.Tuple(
+        elts=[ast.Name(id=k, ctx=ctx, **loc) for k in names], ctx=ctx, **loc
+    )
+
+
+def _make_labels(names: List[str], loc: Dict[str, Any]) -> ast.Tuple:
+    # Tuple of variable names as strings, e.g. "('a', 'b', 'c')"
+    return ast.Tuple(
+        elts=[ast.Constant(k, **loc) for k in names], ctx=_LOAD, **loc
+    )
+
+
+def _make_func(
+    name: str,
+    args: ast.arguments,
+    body: List[ast.stmt],
+    rv: ast.Tuple,
+    loc: Dict[str, Any],
+) -> ast.FunctionDef:
+    # Function that runs 'body' and then returns the state tuple 'rv'
+    return ast.FunctionDef(
+        name=name,
+        args=args,
+        body=[*body, ast.Return(value=rv, **loc)],
+        decorator_list=[],
+        **loc,
+    )
+
+
+def _make_call(
+    func: str,
+    target: ast.Tuple,
+    args: List[ast.expr],
+    kwargs: List[ast.keyword],
+    hints: Mapping[str, Any],
+    loc: Dict[str, Any],
+) -> ast.Assign:
+    # '<target> = <func>(*args, **kwargs, **hints)'
+    for k, v in hints.items():
+        if k in _HINT_LIST_KEYS:
+            continue
+        kwargs.append(ast.keyword(arg=k, value=v, **loc))
+
+    return ast.Assign(
+        targets=[target],
+        value=ast.Call(
+            func=ast.Name(id=func, ctx=_LOAD, **loc),
+            args=args,
+            keywords=kwargs,
+            **loc,
+        ),
+        **loc,
+    )
+
+
+def _make_comment(text: str, loc: Dict[str, Any]) -> ast.Expr:
+    # String literal statement that serves as a comment
+    return ast.Expr(ast.Constant(text, **loc), **loc)
+
+
+# Global names through which transformed code accesses drjit.if_stmt() and
+# drjit.while_loop(). syntax() binds them in the globals of the decorated
+# function, which avoids an import statement within the function body.
+_IF_STMT_NAME = "_drjit_if_stmt"
+_WHILE_LOOP_NAME = "_drjit_while_loop"
+
+# Global name of _if_stmt_identity(), which serves as the 'false_fn' argument
+# of drjit.if_stmt() when an 'if' statement has no 'else' branch
+_IF_STMT_IDENTITY_NAME = "_drjit_if_stmt_identity"
+
+
+def _if_stmt_identity(*args: Any) -> Tuple[Any, ...]:
+    return args
+
+
+def _print_tree(title: str, tree: ast.AST, print_ast: bool, print_code: bool) -> None:
+    # Debug output of syntax(), kept out of line so that the common case
+    # only needs to check the two flags
+    if print_ast:
+        header = f"{title} AST"
+        print(f"{header}\n{'-' * len(header)}\n{ast.dump(tree, indent=4)}\n")
+    if print_code:
+        header = f"{title} code"
+        print(f"{header}\n{'-' * len(header)}\n{ast.unparse(tree)}\n")
+
 
 # Counts how many times the @drjit.syntax decorator has been used
 _syntax_counter = 0
 
+# Transformed code of functions processed by @drjit.syntax, indexed by the
+# original code object, the value of the 'recursive' flag, and the file name.
+# A code object is shared by all functions created by the same 'def'
+# statement, and a reloaded module produces new code objects. Code objects
+# compare by content and ignore 'co_filename', hence the explicit file name
+# that keeps identical functions from different files apart.
+_syntax_code_cache: "weakref.WeakKeyDictionary[types.CodeType, Dict[Tuple[bool, str], types.CodeType]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+# Functions without these keywords contain nothing that @drjit.syntax
+# transforms. Matches in strings or comments merely disable the shortcut.
+_SYNTAX_KEYWORDS = re.compile(r"\b(?:if|while)\b")
+
+
+def _last_line(code: types.CodeType) -> int:
+    # Last line that starts a statement in 'code' or nested code objects
+    last = code.co_firstlineno
+    for _, lineno in dis.findlinestarts(code):
+        if lineno is not None and lineno > last:
+            last = lineno
+    for c in code.co_consts:
+        if type(c) is types.CodeType:
+            last = max(last, _last_line(c))
+    return last
+
+
+def _getsource(f: types.FunctionType) -> Optional[str]:
+    # Extract and dedent the source code of 'f' from the line cache. The
+    # function body ends before the first line (other than blank lines and
+    # comments) that isn't indented more than the 'def' statement or its
+    # first decorator. This is much cheaper than inspect.getsource(), which
+    # tokenizes the whole block. Returns 'None' when the result can't be
+    # trusted.
+    code = f.__code__
+    lines = linecache.getlines(code.co_filename, f.__globals__)
+    start = code.co_firstlineno - 1
+    if start >= len(lines) or hasattr(f, "__wrapped__"):
+        return None
+
+    first = lines[start]
+    header = first.lstrip()
+    if not header.startswith(("@", "def ", "async ")):
+        return None
+
+    # Skip decorators
+    indent, end = len(first) - len(header), start
+    while end < len(lines) and not lines[end][indent:].startswith(("def ", "async ")):
+        end += 1
+    end += 1
+
+    while end < len(lines):
+        line = lines[end]
+        stripped = line.lstrip()
+        if stripped and stripped[0] != "#" and len(line) - len(stripped) <= indent:
+            break
+        end += 1
+
+    # Drop trailing blank lines and comments
+    while end > start + 1 and lines[end - 1].lstrip()[:1] in ("", "#"):
+        end -= 1
+
+    # The block was cut short if the function has code past its end
+    if end < _last_line(code):
+        return None
+
+    # A less indented line might also continue an earlier one (multi-line
+    # strings, brackets, backslashes). Leave such cases to 'inspect'.
+    source = "".join(lines[start:end])
+    if (source.count('"""') % 2 or source.count("'''") % 2 or "\\\n" in source or
+            source.count("(") != source.count(")") or
+            source.count("[") != source.count("]") or
+            source.count("{") != source.count("}")):
+        return None
+
+    return _dedent(source)
+
+
+def _getsource_inspect(f: types.FunctionType) -> str:
+    # Extract and dedent the source code of 'f' using the 'inspect' module
+    try:
+       source = inspect.getsource(f)
+    except OSError as e:
+        raise RuntimeError('You tried to apply the @dr.syntax decorator to a function that was declared on the interactive Python REPL. This is unsupported because Python cannot extract the source code of such functions.') from e
+
+    return _dedent(source)
+
+
+def _dedent(source: str) -> str:
+    # Remove the common indentation of all lines
+    if source[0].isspace():
+        from textwrap import dedent
+
+        source = dedent(source)
+    return source
+
+
+def _syntax_compile(
+    f: types.FunctionType, recursive: bool, print_ast: bool, print_code: bool
+) -> types.CodeType:
+    # Transform and recompile the source code of 'f'
+    old_code = f.__code__
+
+    source = _getsource(f)
+    fast = source is not None
+    if source is None:
+        source = _getsource_inspect(f)
+
+    # Pad the source so that the parser directly produces the line numbers
+    # of the original file. Generated nodes inherit them from the statement
+    # they replace, and no pass over the tree is needed to shift them.
+    filename = old_code.co_filename
+    line_offset = old_code.co_firstlineno - 1
+    try:
+        old_ast = ast.parse("\n" * line_offset + source, filename)
+    except SyntaxError:
+        if not fast:
+            raise
+        # The line-based extraction can be misled by unusual formatting
+        # within the last statement. Retry with the 'inspect' module.
+        source = _getsource_inspect(f)
+        old_ast = ast.parse("\n" * line_offset + source, filename)
+    new_ast = old_ast
+
+    # Leave the function as-is if there is nothing to transform. This check
+    # only runs once the source parsed and covers the entire line table of
+    # 'f', since keywords in a truncated block would otherwise go unseen.
+    if not (print_ast or print_code) and _SYNTAX_KEYWORDS.search(source) is None:
+        return old_code
+
+    # Name of the parsed function. It can differ from that of 'f' when
+    # inspect.getsource() followed a '__wrapped__' attribute.
+    name = cast(ast.FunctionDef, old_ast.body[0]).name
+
+    if print_ast or print_code:
+        _print_tree("Input", old_ast, print_ast, print_code)
+
+    visitor = _SyntaxVisitor(recursive, filename, comments=print_ast or print_code)
+    new_ast = visitor.visit(old_ast)
+
+    if print_ast or print_code:
+        _print_tree("Output", new_ast, print_ast, print_code)
+
+    # Control flow that is entirely scalar (e.g., 'while True:') and has no
+    # dr.hint() annotations is left as-is. In this case, the original
+    # function can be used directly.
+    if not visitor.transformed:
+        return old_code
+
+    try:
+        new_code = compile(new_ast, filename, "exec", dont_inherit=True)
+    except BaseException as e:
+        raise RuntimeError(
+            "The following transformed AST generated by "
+            "@drjit.syntax could not be compiled:\n\n%s" % ast.unparse(new_ast)
+        ) from e
+
+    # Code object of the function (decorator arguments may contain lambdas)
+    for c in new_code.co_consts:
+        if type(c) is types.CodeType and c.co_name == name:
+            return c
+    raise RuntimeError("@drjit.syntax: transformed function not found!")
+
 @overload
 def syntax(
     f: None = None, *, recursive: bool = False, print_ast: bool = False, print_code: bool = False
@@ -757,7 +1118,8 @@ def syntax(
     control flow hints using :py:func:`drjit.hint`. Other hints can also be
     provided to request compilation using evaluated/symbolic mode, or to
     specify a maximum number of loop iteration for reverse-mode automatic
-    differentiation.
+    differentiation. Predicates that only consist of literals (e.g., ``while
+    True:``) are detected automatically and never transformed.
 
     .. code-block:: python
 
@@ -830,58 +1192,43 @@ def syntax(
     if mod.startswith('drjit') or mod.startswith('pytest'):
         raise RuntimeError(f'You tried to apply the @dr.syntax decorator to a function in the "{mod}" namespace, giving up. It is likely that you declared decorators in the wrong order (@dr.syntax should be "closest" to the actual function definition).')
 
-    # Warn if this function is used many times
-    _syntax_counter += 1
-    if _syntax_counter > 1000:
-        import warnings
-
-        warnings.warn(
-            "The AST-transforming decorator @drjit.syntax was called more than "
-            "1000 times by your program. Since transforming and recompiling "
-            "Python code is a relatively expensive operation, it should not "
-            "be used within loops or subroutines. Please move the function to "
-            "be transformed to the top program level and decorate it there.",
-            RuntimeWarning,
-        )
-
-    try:
-       source = inspect.getsource(f)
-    except OSError as e:
-        raise RuntimeError('You tried to apply the @dr.syntax decorator to a function that was declared on the interactive Python REPL. This is unsupported because Python cannot extract the source code of such functions.') from e
-
-    if source[0].isspace():
-        from textwrap import dedent
-
-        source = dedent(source)
-
-    old_ast = ast.parse(source)
+    # Transforming and recompiling a function is expensive. Reuse the result
+    # when the same function definition is decorated multiple times.
     old_code = f.__code__
-    filename = old_code.co_filename
-    new_ast = old_ast
-    line_offset = old_code.co_firstlineno - 1
+    cache = _syntax_code_cache.get(old_code)
+    if cache is None:
+        cache = _syntax_code_cache[old_code] = {}
+    key = (recursive, old_code.co_filename)
+    new_code = cache.get(key)
+
+    if new_code is None or print_ast or print_code:
+        # Warn (once) if this function is used many times
+        _syntax_counter += 1
+        if _syntax_counter == 1001:
+            import warnings
+
+            warnings.warn(
+                "The AST-transforming decorator @drjit.syntax was called more than "
+                "1000 times by your program. Since transforming and recompiling "
+                "Python code is a relatively expensive operation, it should not "
+                "be used within loops or subroutines. Please move the function to "
+                "be transformed to the top program level and decorate it there.",
+                RuntimeWarning,
+            )
 
-    if print_ast:
-        print(f"Input AST\n---------\n{ast.dump(old_ast, indent=4)}\n")
-    if print_code:
-        print(f"Input code\n----------\n{ast.unparse(old_ast)}\n")
+        new_code = cache[key] = _syntax_compile(
+            f, recursive, print_ast, print_code
+        )
 
-    new_ast = _SyntaxVisitor(recursive, filename, line_offset).visit(old_ast)
-    new_ast = ast.fix_missing_locations(new_ast)
+    if new_code is old_code:
+        return f
 
-    if print_ast:
-        print(f"Output AST\n----------\n{ast.dump(new_ast, indent=4)}\n")
-    if print_code:
-        print(f"Output code\n-----------\n{ast.unparse(new_ast)}\n")
+    # Bind the functions called by the transformed code (see _IF_STMT_NAME)
+    from drjit import if_stmt, while_loop
+    f.__globals__.setdefault(_IF_STMT_NAME, if_stmt)
+    f.__globals__.setdefault(_WHILE_LOOP_NAME, while_loop)
+    f.__globals__.setdefault(_IF_STMT_IDENTITY_NAME, _if_stmt_identity)
 
-    ast.increment_lineno(new_ast, line_offset)
-    try:
-        new_code = compile(new_ast, filename, "exec")
-    except BaseException as e:
-        raise RuntimeError(
-            "The following transformed AST generated by "
-            "@drjit.syntax could not be compiled:\n\n%s" % ast.unparse(new_ast)
-        ) from e
-    new_code = next(x for x in new_code.co_consts if isinstance(x, types.CodeType))
     new_func = types.FunctionType(new_code, f.__globals__)
     new_func.__defaults__ = f.__defaults__
     return new_func
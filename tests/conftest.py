@@ -9,12 +9,14 @@ except ImportError:
 import types
 import pytest
 import re
+from functools import lru_cache
 
-array_types = []
-array_packages = []
+# Splits test_arrays() queries at commas that aren't enclosed in parentheses
+_QUERY_SPLIT_RE = re.compile(r',\s*(?![^()]*\))')
 
-def traverse(o):
-    if isinstance(o, types.ModuleType):
+def traverse(o, array_types, array_packages):
+    # Only visit Dr.Jit's own submodules (drjit.llvm, drjit.cuda.ad, ..)
+    if isinstance(o, types.ModuleType) and o.__name__.startswith('drjit.'):
         if hasattr(o, 'ArrayXf'):
             array_packages.append(o)
 
@@ -22,11 +24,30 @@ def traverse(o):
             if isinstance(o2, type) and issubclass(o2, dr.ArrayBase):
                 array_types.append(o2)
 
-        traverse(getattr(o, 'ad', None))
+        traverse(getattr(o, 'ad', None), array_types, array_packages)
 
 
-for o in dr.__dict__.values():
-    traverse(o)
+@lru_cache(maxsize=None)
+def get_arrays():
+    """
+    Return lists of all Dr.Jit array types and array packages (e.g.
+    ``drjit.llvm.ad``). The namespace is only scanned upon first use.
+    """
+    array_types, array_packages = [], []
+    for o in dr.__dict__.values():
+        traverse(o, array_types, array_packages)
+    return array_types, array_packages
+
+# Array types whose ``__meta__`` descriptor contains a given query entry
+# (a substring, e.g. 'float' also matches 'float32'), filled on demand
+_meta_index = {}
+
+def _query_meta(entry):
+    found = _meta_index.get(entry)
+    if found is None:
+        found = _meta_index[entry] = frozenset(
+            a for a in get_arrays()[0] if entry in a.__meta__)
+    return found
 
 
 def test_arrays(*queries, name='t'):
@@ -43,12 +64,11 @@ def test_arrays(*queries, name='t'):
     The type argument of the subsequent testcase must be named "t"
     """
 
-    combined = set()
-    if len(queries) == 0:
-        combined = set(array_types)
+    array_types = get_arrays()[0]
+    parts = []
 
     for query in queries:
-        query = re.split(r',\s*(?![^()]*\))', query)
+        query = _QUERY_SPLIT_RE.split(query)
         result = set(array_types)
         for entry in query:
             if len(entry) == 0:
@@ -59,13 +79,15 @@ def test_arrays(*queries, name='t'):
                 entry = entry[1:]
                 remove = True
 
-            found = set(a for a in array_types if entry in a.__meta__)
+            found = _query_meta(entry)
             if remove:
-                result = result.difference(found)
+                result -= found
             else:
-                result = result.intersection(found)
+                result &= found
+
+        parts.append(result)
 
-        combined |= result
+    combined = set().union(*parts) if parts else set(array_types)
 
     if len(combined) == 0:
         raise Exception('Query failed')
@@ -99,7 +121,7 @@ def skip_on(exception, reason):
 
 def test_packages(name='p'):
     def wrapped(func):
-        return pytest.mark.parametrize(name, array_packages)(func)
+        return pytest.mark.parametrize(name, get_arrays()[1])(func)
     return wrapped
 
 @pytest.fixture(scope="function")
@@ -1,5 +1,9 @@
 import drjit as dr
+import drjit.ast
 import pytest
+import ast
+import inspect
+import functools
 
 @pytest.test_arrays('shape=(*), uint32, jit')
 @dr.syntax
@@ -23,3 +27,234 @@ def test01_comprehensions(t):
         i += 1
 
     assert result[0] == 3
+
+@dr.syntax
+def test02_constant_predicate():
+    # Loops and conditionals whose predicate only consists of literals are
+    # left as-is, which permits 'break' and 'return' statements within them
+    i = 0
+    while True:
+        i += 1
+        if dr.hint(i == 5, mode='scalar'):
+            break
+
+    if not True:
+        return
+
+    assert i == 5
+
+def test03_reuse_transformed_code():
+    # Decorating the same function definition multiple times only
+    # transforms and compiles its code once
+    funcs = []
+    for i in range(2):
+        @dr.syntax
+        def f(x):
+            while x < 10:
+                x += 1
+            return x
+        funcs.append(f)
+
+    assert funcs[0] is not funcs[1]
+    assert funcs[0].__code__ is funcs[1].__code__
+
+def test04_no_control_flow():
+    # Functions without 'if' or 'while' statements are returned unchanged
+    def f(x, *, y=2):
+        return x * y
+
+    assert dr.syntax(f) is f
+
+@dr.syntax
+def test05_scalar_hint_removed():
+    # dr.hint() annotations are removed from scalar predicates. Their
+    # keyword arguments are never evaluated, hence 'later' can be referenced
+    # before it is assigned
+    i = 0
+    while dr.hint(i < 5, mode='scalar', exclude=[later]):
+        i += 1
+    later = i
+    assert later == 5
+
+def loop_state(f):
+    # Names of the state variables of the loop transformed in 'f'
+    body = next(c for c in f.__code__.co_consts
+                if getattr(c, 'co_name', None) == '_loop_body')
+    return body.co_varnames[:body.co_argcount]
+
+@pytest.test_arrays('shape=(*), uint32, jit')
+def test06_lambda_in_loop(t):
+    # Variables that are only read within a lambda aren't part of the loop
+    # state. The lambda still captures them from the enclosing function.
+    @dr.syntax
+    def f(i, x):
+        scale = 2
+        while i < 3:
+            g = lambda v: v * scale
+            x += g(i)
+            i += 1
+        return x
+
+    assert loop_state(f) == ('i', 'x')
+    assert f(dr.zeros(t, 1), dr.zeros(t, 1))[0] == 6
+
+@pytest.test_arrays('shape=(*), uint32, jit')
+def test07_class_in_loop(t):
+    # Assignments within a class body don't affect the loop state
+    @dr.syntax
+    def f(i, x):
+        while i < 3:
+            class A:
+                val = 2
+            x += i * A.val
+            i += 1
+        return x
+
+    assert loop_state(f) == ('i', 'x')
+    assert f(dr.zeros(t, 1), dr.zeros(t, 1))[0] == 6
+
+@pytest.test_arrays('shape=(*), uint32, jit')
+@pytest.mark.parametrize('n', [3], ids=lambda n: f'n={n}')
+@dr.syntax
+def test08_decorator_with_lambda(t, n):
+    # The lambda in the decorator above is compiled before the function
+    # itself, which must not confuse @dr.syntax
+    i = dr.zeros(t, 1)
+    while i < n:
+        i += 1
+    assert i[0] == n
+
+# The following functions exercise the line-based source extraction of
+# drjit.ast._getsource() and its fallbacks to inspect.getsource()
+
+def src_multiline_string(n):
+    s = """
+a string at column 0
+"""
+    while n < 10:
+        n += len(s)
+    return n
+
+def src_bracket_continuation(n):
+    k = (1 +
+2)
+    while n < 10:
+        n += k
+    return n
+
+def src_backslash_continuation(n):
+    k = 1 + \
+2
+    while n < 10:
+        n += k
+    return n
+
+def src_bracket_in_string(n):
+    # The literal balances the bracket count of the truncated block
+    x = ")"
+    k = (1 +
+2)
+    while n < 10:
+        n += k + len(x)
+    return n
+
+def src_quotes_in_string(n):
+    # The literal evens out the triple quote count of the truncated block
+    q = '"""'
+    s = """
+column 0
+"""
+    while n < 10:
+        n += len(q) + len(s)
+    return n
+
+def src_if_before_cut(n):
+    if n > 100:
+        n = 0
+    x = ")"
+    k = (1 +
+2)
+    while n < 10:
+        n += k + len(x)
+    return n
+
+def src_decorator(*args):
+    return lambda f: f
+
+@src_decorator(
+    1,
+    2
+)
+def src_multiline_decorator(n):
+    while n < 10:
+        n += 3
+    return n
+
+def src_trailing_comments(n):
+    while n < 10:
+        n += 3
+    return n
+    # A comment that belongs to no function
+# Another one
+
+def src_wrapper(n):
+    return src_trailing_comments(n)
+
+functools.update_wrapper(src_wrapper, src_trailing_comments)
+
+@pytest.mark.parametrize('f, fallback', [
+    (src_multiline_string, True),
+    (src_bracket_continuation, True),
+    (src_backslash_continuation, True),
+    (src_bracket_in_string, True),
+    (src_quotes_in_string, True),
+    (src_if_before_cut, True),
+    (src_multiline_decorator, False),
+    (src_trailing_comments, False),
+    (src_wrapper, True)
+])
+def test09_getsource(f, fallback, monkeypatch):
+    source = drjit.ast._getsource(f)
+    if fallback:
+        assert source is None
+    else:
+        assert ast.dump(ast.parse(source)) == \
+            ast.dump(ast.parse(inspect.getsource(f)))
+
+    # Compare against a transformation based on inspect.getsource()
+    g1 = dr.syntax(f)
+    drjit.ast._syntax_code_cache.pop(f.__code__, None)
+    with monkeypatch.context() as m:
+        m.setattr(drjit.ast, '_getsource', lambda f: None)
+        g2 = dr.syntax(f)
+    drjit.ast._syntax_code_cache.pop(f.__code__, None)
+
+    assert g1 is not f and g2 is not f
+    assert g1(0) == g2(0) == f(0)
+
+def test10_getsource_unavailable():
+    # Functions without source code (e.g., declared on the REPL) are rejected
+    ns = {'__name__': 'repl'}
+    exec("def f(n):\n    while n < 3:\n        n += 1\n    return n\n", ns)
+    with pytest.raises(RuntimeError, match='interactive Python REPL'):
+        dr.syntax(ns['f'])
+
+def test11_reuse_per_file(tmp_path):
+    # Code objects compare equal regardless of their file name. Identical
+    # functions from different files must still keep their own file name.
+    import importlib.util
+    source = "def f(x):\n    while x < 10:\n        x += 1\n    return x\n"
+    funcs = []
+    for name in ('a', 'b'):
+        path = tmp_path / f'{name}.py'
+        path.write_text(source)
+        spec = importlib.util.spec_from_file_location(f'ast_reuse_{name}', path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        funcs.append((module.f, str(path)))
+
+    assert funcs[0][0].__code__ == funcs[1][0].__code__
+    for f, path in funcs:
+        g = dr.syntax(f)
+        assert g.__code__.co_filename == path
+        assert g(0) == 10
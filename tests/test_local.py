@@ -40,28 +40,45 @@ def test02_fill_in_loop_then_read(t):
     assert s[3] == 3
 
 
+@dr.syntax
+def fill_random(t, s, n):
+    # Fill the first 'n' entries of the local memory array 's' with the
+    # output of a PCG32 generator (10000 lanes)
+    import sys
+    rng = sys.modules[t.__module__].PCG32()
+    rng.state = 1234 + dr.arange(t, 10000)
+    rng.inc = t(1)
+    rng.next_uint32()
+    i = t(0)
+    while i < n:
+        s[i] = rng.next_uint32()
+        i += 1
+
+
+# Sorted values of the first lane of fill_random(t, s, 32)
+SORTED_RANDOM = [
+    25948406, 86800510, 163991264, 724914361, 798920662, 848337899,
+    1331190098, 1441102920, 1445257284, 1461834408, 1497151495, 1547771419,
+    1603554384, 1691880696, 1797163244, 1936973067, 2311034952, 2444167623,
+    2607360471, 2819391842, 2948902546, 2967546311, 3059896137, 3153572993,
+    3235986370, 3262142078, 3348457850, 3408296642, 3467369332, 3614138351,
+    3631189001, 3663081236,
+]
+
+
 @pytest.test_arrays('jit,uint32,shape=(*)')
 @pytest.mark.parametrize('variant', [0,1])
 @pytest.mark.parametrize('symbolic_loop', [True, False])
 @pytest.mark.parametrize('symbolic_cond', [True, False])
 @dr.syntax
 def test03_bubble_sort(t, variant, symbolic_loop, symbolic_cond):
-    import sys
     n = 32
     s = dr.alloc_local(t, n)
     Bool = dr.mask_t(t)
 
     with dr.scoped_set_flag(dr.JitFlag.SymbolicLoops, symbolic_loop):
         with dr.scoped_set_flag(dr.JitFlag.SymbolicConditionals, symbolic_cond):
-            rng = sys.modules[t.__module__].PCG32()
-            rng.state = 1234 + dr.arange(t, 10000)
-            rng.inc = t(1)
-            rng.next_uint32()
-            i = t(0)
-            while i < n:
-                s[i] = rng.next_uint32()
-                i += 1
-
+            fill_random(t, s, n)
 
             i = t(0)
             cont=Bool(True)
@@ -71,9 +88,7 @@ def test03_bubble_sort(t, variant, symbolic_loop, symbolic_cond):
                 while j < n-i-1:
                     if dr.hint(variant == 0, mode='scalar'):
                         s0, s1 = s[j], s[j+1]
-                        if s0 > s1:
-                            s0, s1 = s1, s0
-                        s[j], s[j+1] = s0, s1
+                        s[j], s[j+1] = dr.minimum(s0, s1), dr.maximum(s0, s1)
                     else:
                         if s[j] > s[j+1]:
                             s[j], s[j+1] = s[j+1], s[j]
@@ -86,7 +101,7 @@ def test03_bubble_sort(t, variant, symbolic_loop, symbolic_cond):
     for i in range(len(result)-1):
         assert dr.all(result[i] <= result[i + 1])
     q = [a[0] for a in result]
-    assert q == [25948406, 86800510, 163991264, 724914361, 798920662, 848337899, 1331190098, 1441102920, 1445257284, 1461834408, 1497151495, 1547771419, 1603554384, 1691880696, 1797163244, 1936973067, 2311034952, 2444167623, 2607360471, 2819391842, 2948902546, 2967546311, 3059896137, 3153572993, 3235986370, 3262142078, 3348457850, 3408296642, 3467369332, 3614138351, 3631189001, 3663081236]
+    assert q == SORTED_RANDOM
 
 
 @pytest.test_arrays('jit,uint32,shape=(*)')
@@ -150,33 +165,28 @@ def test07_pytree(t):
 
 
 @pytest.test_arrays('jit,-diff,uint32,shape=(*)')
-@dr.syntax
 def test08_oob_read(t, capsys):
-    i, r = t(0), t(0)
     v = dr.alloc_local(t, size=10, value=t(0))
     with pytest.raises(RuntimeError, match=r"out of bounds read \(source size=10, offset=100\)"):
         v[100]
     with pytest.raises(RuntimeError, match=r"out of bounds write \(target size=10, offset=100\)"):
         v[100] = 0
     with dr.scoped_set_flag(dr.JitFlag.Debug, True):
-        while i < 100:
-            r += v[i]
-            i += 1
-        assert r == 0
+        # Vectorized read, where only the last lane is out of bounds
+        i = t(*range(10), 99)
+        assert dr.all(v[i] == 0)
 
     transcript = capsys.readouterr().err
     assert 'drjit.Local.read(): out-of-bounds read from position 99 in an array of size 10' in transcript
 
 
 @pytest.test_arrays('jit,-diff,uint32,shape=(*)')
-@dr.syntax
 def test09_oob_write(t, capsys):
-    i, r = t(0), t(0)
     v = dr.alloc_local(t, size=10, value=t(0))
     with dr.scoped_set_flag(dr.JitFlag.Debug, True):
-        while i < 100:
-            v[i] = i
-            i += 1
+        # Vectorized write, where only the last lane is out of bounds
+        i = t(*range(10), 99)
+        v[i] = i
     print(v[0])
 
     transcript = capsys.readouterr().err
@@ -196,3 +206,40 @@ def test10_loop_read_then_write(t, capsys):
         local[size] = t(4)
 
     assert val[0] == 16
+
+
+def bitonic_pairs(n):
+    # Compare-and-swap index pairs of a bitonic sorting network of size 'n'
+    k = 2
+    while k <= n:
+        j = k // 2
+        while j > 0:
+            for i in range(n):
+                l = i ^ j
+                if l > i:
+                    yield (i, l) if i & k == 0 else (l, i)
+            j //= 2
+        k *= 2
+
+
+@pytest.test_arrays('jit,uint32,shape=(*)')
+@pytest.mark.parametrize('symbolic_loop', [True, False])
+def test11_sorting_network(t, symbolic_loop):
+    # Like test03_bubble_sort, but using a branchless sorting network
+    # that only accesses local memory at fixed positions
+    n = 32
+    s = dr.alloc_local(t, n)
+
+    with dr.scoped_set_flag(dr.JitFlag.SymbolicLoops, symbolic_loop):
+        fill_random(t, s, n)
+
+    for a, b in bitonic_pairs(n):
+        sa, sb = s[a], s[b]
+        s[a], s[b] = dr.minimum(sa, sb), dr.maximum(sa, sb)
+
+    result = [s[j] for j in range(n)]
+    dr.eval(result)
+    for i in range(len(result)-1):
+        assert dr.all(result[i] <= result[i + 1])
+    q = [a[0] for a in result]
+    assert q == SORTED_RANDOM